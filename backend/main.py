@@ -2,7 +2,7 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
-from .recommender import Recommender, Recommendation
+from .recommender import Recommender, Recommendation, normalize_query
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -49,21 +49,39 @@ def root():
         "name": "SHL Assessment Recommender API",
         "docs": "/docs",
         "health": "/health",
-        "recommend": "/recommend"
+        "recommend": "/recommend",
+        "stats": "/stats"
     }
 
 
-@app.post("/recommend", response_model=RecommendResponse)
-def recommend(req: RecommendRequest):
-    query = req.query.strip()
-    if not query:
-        raise HTTPException(status_code=400, detail="Query must not be empty")
-    recs = recommender.recommend(query, k=10)
+@app.get("/stats")
+def stats():
+    # Single-flight counters: 'coalesced' requests reused an in-flight computation
+    return {"coalescing": recommender.coalescing_stats()}
+
+
+MAX_BATCH_QUERIES = 50
+
+
+class BatchRecommendRequest(BaseModel):
+    queries: List[str]
+
+
+class BatchRecommendItem(BaseModel):
+    query: str
+    recommended_assessments: List[RecommendedAssessment]
+
+
+class BatchRecommendResponse(BaseModel):
+    results: List[BatchRecommendItem]
+
+
+def _to_items(recs: List[Recommendation]) -> List[RecommendedAssessment]:
     # Enforce 5-10 results
     recs = recs[:10]
     if len(recs) < 5:
         recs = recs + recs[: max(0, 5 - len(recs))]
-    items = [
+    return [
         RecommendedAssessment(
             url=r.assessment_url,
             adaptive_support=r.adaptive_support,
@@ -74,4 +92,28 @@ def recommend(req: RecommendRequest):
         )
         for r in recs
     ]
-    return RecommendResponse(recommended_assessments=items)
+
+
+@app.post("/recommend", response_model=RecommendResponse)
+def recommend(req: RecommendRequest):
+    query = normalize_query(req.query)
+    if not query:
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    return RecommendResponse(recommended_assessments=_to_items(recommender.recommend(query, k=10)))
+
+
+@app.post("/recommend/batch", response_model=BatchRecommendResponse)
+def recommend_batch(req: BatchRecommendRequest):
+    queries = [normalize_query(q) for q in req.queries]
+    if not queries or not all(queries):
+        raise HTTPException(status_code=400, detail="Queries must be a non-empty list of non-empty strings")
+    if len(queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    # One batched encode + search for all unique queries
+    results = recommender.recommend_batch(queries, k=10)
+    return BatchRecommendResponse(
+        results=[
+            BatchRecommendItem(query=q, recommended_assessments=_to_items(recs))
+            for q, recs in zip(queries, results)
+        ]
+    )
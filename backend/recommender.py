@@ -1,7 +1,9 @@
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 import re
 import os
 
@@ -19,6 +21,7 @@ except Exception:
     genai = None
 
 CATALOG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'catalog.jsonl')
+BATCH_WORKERS = 4  # concurrent rerank/selection workers in recommend_batch
 
 
 @dataclass
@@ -32,6 +35,158 @@ class Recommendation:
     relevance_score: Optional[float]
 
 
+class _Flight:
+    """A single in-flight recommend computation shared by concurrent callers."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None  # type: Optional[List[Recommendation]]
+        self.error = None  # type: Optional[BaseException]
+
+
+def normalize_query(query: str) -> str:
+    # Collapse newlines/tabs/multiple spaces so trivially different copies share a key
+    return " ".join((query or "").split()).strip()
+
+
+def _check_selection_params(max_per_type, type_quotas, mmr_lambda):
+    if max_per_type is not None and max_per_type < 0:
+        raise ValueError(f"max_per_type must be >= 0, got {max_per_type}")
+    for t, q in (type_quotas or {}).items():
+        if q < 0:
+            raise ValueError(f"type quota for {t!r} must be >= 0, got {q}")
+    if mmr_lambda is not None and not 0.0 <= mmr_lambda <= 1.0:
+        raise ValueError(f"mmr_lambda must be in [0, 1], got {mmr_lambda}")
+
+
+def _selection_params_from_env():
+    """
+    Read SELECT_MAX_PER_TYPE (int), SELECT_TYPE_QUOTAS ("K=3,P=2") and
+    SELECT_MMR_LAMBDA (0..1) from the environment; unset means disabled.
+    """
+    max_per_type = os.environ.get('SELECT_MAX_PER_TYPE', '').strip()
+    max_per_type = int(max_per_type) if max_per_type else None
+    type_quotas = {}
+    for part in os.environ.get('SELECT_TYPE_QUOTAS', '').split(','):
+        if not part.strip():
+            continue
+        t, sep, q = part.partition('=')
+        if not sep or not t.strip():
+            raise ValueError(f"SELECT_TYPE_QUOTAS entries must look like TYPE=N, got {part!r}")
+        type_quotas[t.strip()] = int(q)
+    mmr_lambda = os.environ.get('SELECT_MMR_LAMBDA', '').strip()
+    mmr_lambda = float(mmr_lambda) if mmr_lambda else None
+    _check_selection_params(max_per_type, type_quotas, mmr_lambda)
+    return max_per_type, (type_quotas or None), mmr_lambda
+
+
+QUERY_POOLING_MODES = ('mean', 'max')
+
+
+def _chunk_params_from_env():
+    """
+    Read QUERY_CHUNK_TOKENS (int >= 1, capped at the model limit),
+    QUERY_MAX_CHUNKS (int >= 1, default 8) and QUERY_POOLING ('mean' or 'max').
+    """
+    chunk_tokens = os.environ.get('QUERY_CHUNK_TOKENS', '').strip()
+    chunk_tokens = int(chunk_tokens) if chunk_tokens else None
+    if chunk_tokens is not None and chunk_tokens < 1:
+        raise ValueError(f"QUERY_CHUNK_TOKENS must be >= 1, got {chunk_tokens}")
+    max_chunks = int(os.environ.get('QUERY_MAX_CHUNKS', '').strip() or 8)
+    if max_chunks < 1:
+        raise ValueError(f"QUERY_MAX_CHUNKS must be >= 1, got {max_chunks}")
+    pooling = os.environ.get('QUERY_POOLING', '').strip().lower() or 'mean'
+    if pooling not in QUERY_POOLING_MODES:
+        raise ValueError(f"QUERY_POOLING must be one of {QUERY_POOLING_MODES}, got {pooling!r}")
+    return chunk_tokens, max_chunks, pooling
+
+
+def select_candidates(
+    types: List[Optional[str]],
+    urls: List[Optional[str]],
+    k: int,
+    scores: Optional[np.ndarray] = None,
+    emb: Optional[np.ndarray] = None,
+    balance: bool = True,
+    max_per_type: Optional[int] = None,
+    type_quotas: Optional[Dict[str, int]] = None,
+    mmr_lambda: Optional[float] = None,
+) -> List[int]:
+    """
+    Pick up to k candidate positions from a ranked candidate list.
+
+    Candidates are deduplicated by URL first (keeping the best-ranked copy),
+    then capped per type (type_quotas overrides max_per_type). Without MMR,
+    types are interleaved round-robin in rank order when balance is set.
+    With mmr_lambda and embeddings, greedy MMR trades score against the max
+    cosine similarity to already selected items.
+    """
+    _check_selection_params(max_per_type, type_quotas, mmr_lambda)
+    n = len(urls)
+    if k <= 0 or n == 0:
+        return []
+    quotas = type_quotas or {}
+    use_mmr = mmr_lambda is not None and emb is not None and scores is not None
+    # Single pass: dedup, type codes, within-type rank and quota caps
+    seen = set()
+    codes = {}  # type: Dict[str, int]
+    counts = []  # type: List[int]
+    caps = []  # type: List[Optional[int]]
+    keep, code_arr, rank_arr = [], [], []
+    for i in range(n):
+        u = urls[i]
+        if not u or u in seen:
+            continue
+        seen.add(u)
+        t = types[i] or 'Unknown'
+        c = codes.get(t)
+        if c is None:
+            c = codes[t] = len(codes)
+            counts.append(0)
+            caps.append(quotas.get(t, max_per_type))
+        if not use_mmr and caps[c] is not None and counts[c] >= caps[c]:
+            continue
+        keep.append(i)
+        code_arr.append(c)
+        rank_arr.append(counts[c])
+        counts[c] += 1
+    if not keep:
+        return []
+    keep_a = np.asarray(keep, dtype=np.int64)
+    code_a = np.asarray(code_arr, dtype=np.int64)
+    if use_mmr:
+        return _mmr_select(keep_a, code_a, caps, k, scores, emb, float(mmr_lambda))
+    known = sum(1 for t in codes if t != 'Unknown')
+    if balance and known >= 2:
+        # Round-robin == order by (rank within type, first appearance of type)
+        order = np.lexsort((code_a, np.asarray(rank_arr, dtype=np.int64)))
+        keep_a = keep_a[order]
+    return keep_a[:k].tolist()
+
+
+def _mmr_select(keep, codes, caps, k, scores, emb, lam):
+    rel = np.asarray(scores, dtype=np.float32)[keep]
+    vecs = np.asarray(emb, dtype=np.float32)[keep]
+    max_sim = np.zeros(len(keep), dtype=np.float32)
+    open_mask = np.ones(len(keep), dtype=bool)
+    taken = [0] * len(caps)
+    for c, cap in enumerate(caps):
+        if cap is not None and cap <= 0:
+            open_mask[codes == c] = False
+    picked = []
+    while len(picked) < k and open_mask.any():
+        mmr = np.where(open_mask, lam * rel - (1.0 - lam) * max_sim, -np.inf)
+        j = int(np.argmax(mmr))
+        picked.append(int(keep[j]))
+        open_mask[j] = False
+        np.maximum(max_sim, vecs @ vecs[j], out=max_sim)
+        c = int(codes[j])
+        taken[c] += 1
+        if caps[c] is not None and taken[c] >= caps[c]:
+            open_mask[codes == c] = False
+    return picked
+
+
 class Recommender:
     def __init__(self):
         # Lazy init to keep memory low on Render free tier
@@ -45,6 +200,14 @@ class Recommender:
         self.descs = []
         self.emb = None
         self.index = None
+        # Single-flight coalescing of identical concurrent queries
+        self._flights = {}  # type: Dict[Tuple[str, int], _Flight]
+        self._flights_lock = threading.Lock()
+        self._stats = {'requests': 0, 'computed': 0, 'coalesced': 0}
+        # Post-retrieval selection: per-type caps and optional MMR diversity (0..1)
+        self.max_per_type, self.type_quotas, self.mmr_lambda = _selection_params_from_env()
+        # Long queries: split into token-bounded chunks, encode in one batch, then pool
+        self.query_chunk_tokens, self.max_query_chunks, self.query_pooling = _chunk_params_from_env()
 
     def _load_catalog(self, limit: Optional[int] = None):
         self.items = []
@@ -79,7 +242,8 @@ class Recommender:
             self._load_catalog(limit=limit)
         if self.model is None:
             self.model = SentenceTransformer(self.model_name)
-        if self.emb is None or (self.index is None and self.texts):
+        # Without faiss the index stays None; only rebuild when embeddings are missing
+        if self.emb is None or (faiss is not None and self.index is None and self.texts):
             self._build_index()
 
     def _build_index(self):
@@ -97,29 +261,141 @@ class Recommender:
         else:
             self.index = None
 
+    def _query_chunks(self, query: str) -> List[str]:
+        """
+        Split a query into near-equal chunks that fit the model's token limit.
+        At most max_query_chunks are kept, spread evenly so late requirements survive.
+        """
+        tokenizer = getattr(self.model, 'tokenizer', None)
+        # Never exceed what the model encodes without truncation ([CLS]/[SEP] take 2)
+        size = (getattr(self.model, 'max_seq_length', None) or 256) - 2
+        if self.query_chunk_tokens:
+            size = min(size, self.query_chunk_tokens)
+        if tokenizer is None or size <= 0:
+            return [query]
+        ids = tokenizer(query, add_special_tokens=False)['input_ids']
+        if len(ids) <= size:
+            return [query]
+        # ceil(len/size) equal slices, so no chunk is a tiny tail that skews pooling
+        n = -(-len(ids) // size)
+        bounds = [i * len(ids) // n for i in range(n + 1)]
+        picks = range(n)
+        if n > self.max_query_chunks:
+            picks = sorted(set(np.linspace(0, n - 1, num=self.max_query_chunks).round().astype(int).tolist()))
+        return [tokenizer.decode(ids[bounds[i]:bounds[i + 1]]) for i in picks]
+
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Encode the chunks of all queries in one batched call, then pool per query."""
+        chunks = [self._query_chunks(q) for q in queries]
+        flat = [c for cs in chunks for c in cs]
+        vecs = self.model.encode(flat, normalize_embeddings=True, convert_to_numpy=True)
+        out = []
+        start = 0
+        for cs in chunks:
+            v = vecs[start:start + len(cs)]
+            start += len(cs)
+            if len(cs) == 1:
+                out.append(v[0])
+                continue
+            q = v.max(axis=0) if self.query_pooling == 'max' else v.mean(axis=0)
+            norm = float(np.linalg.norm(q))
+            out.append(q / norm if norm > 0 else q)
+        return np.asarray(out, dtype=np.float32)
+
+    def _encode_query(self, query: str) -> np.ndarray:
+        return self._encode_queries([query])[0]
+
     def _knn(self, qvec: np.ndarray, topk: int = 20):
+        D, I = self._knn_batch(qvec.reshape(1, -1), topk=topk)
+        return D[0], I[0]
+
+    def _knn_batch(self, qvecs: np.ndarray, topk: int = 20):
         if self.index is not None:
-            D, I = self.index.search(qvec.reshape(1, -1).astype('float32'), topk)
-            return D[0], I[0]
+            return self.index.search(qvecs.astype('float32'), topk)
         # numpy fallback
-        sims = (self.emb @ qvec)
-        I = np.argsort(-sims)[:topk]
-        D = sims[I]
+        sims = qvecs @ self.emb.T
+        I = np.argsort(-sims, axis=1)[:, :topk]
+        D = np.take_along_axis(sims, I, axis=1)
         return D, I
 
     def recommend(self, query: str, k: int = 10) -> List[Recommendation]:
+        """
+        Recommend assessments for a query. Concurrent calls with the same
+        normalized query and k wait on one shared computation instead of
+        each running encode, kNN and rerank again.
+        """
+        key = (normalize_query(query), int(k))
+        with self._flights_lock:
+            self._stats['requests'] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self._stats['computed'] += 1
+            else:
+                self._stats['coalesced'] += 1
+        if leader:
+            try:
+                flight.result = self._recommend(key[0], k=key[1])
+            except BaseException as e:
+                flight.error = e
+            finally:
+                # Drop the flight before waking waiters so later calls recompute
+                with self._flights_lock:
+                    self._flights.pop(key, None)
+                flight.done.set()
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return list(flight.result or [])
+
+    def coalescing_stats(self) -> Dict[str, int]:
+        """Counters for the single-flight layer; 'coalesced' is computations saved."""
+        with self._flights_lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._flights)
+        return stats
+
+    def recommend_batch(self, queries: List[str], k: int = 10) -> List[List[Recommendation]]:
+        """
+        Recommend for many queries at once. Unique normalized queries are
+        encoded in one batched call and searched together; the per-query
+        rerank and selection stage then runs concurrently.
+        """
+        queries = [normalize_query(q) for q in queries]
+        unique = list(dict.fromkeys(queries))
+        if not unique:
+            return []
+        self.ensure_ready(limit=max(400, k * 50))
+        if not self.items:
+            return [[] for _ in queries]
+        Q = self._encode_queries(unique)
+        D, I = self._knn_batch(Q, topk=max(30, k*3))
+        with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(unique))) as pool:
+            ranked = list(pool.map(lambda j: self._rank(unique[j], D[j], I[j], k), range(len(unique))))
+        done = dict(zip(unique, ranked))
+        return [list(done[q]) for q in queries]
+
+    def _recommend(self, query: str, k: int = 10) -> List[Recommendation]:
         # Ensure model and index are ready (lazy init)
         self.ensure_ready(limit=max(400, k * 50))
         if not self.items:
             return []
-        q = self.model.encode([query], normalize_embeddings=True, convert_to_numpy=True)[0].astype('float32')
+        q = self._encode_query(query)
         D, I = self._knn(q, topk=max(30, k*3))
+        return self._rank(query, D, I, k)
+
+    def _rank(self, query: str, D: np.ndarray, I: np.ndarray, k: int) -> List[Recommendation]:
+        """Rerank (optionally with Gemini), select and format kNN hits for one query."""
         # Collect candidates
         cands = []
         for score, idx in zip(D, I):
             if idx < 0 or idx >= len(self.items):
                 continue
             cands.append({
+                'idx': int(idx),
                 'name': self.names[idx],
                 'url': self.urls[idx],
                 'type': self.types[idx] or None,
@@ -159,31 +435,18 @@ class Recommender:
                     cands.sort(key=lambda x: x['score'], reverse=True)
             except Exception:
                 pass
-        # Balance across types if query suggests multiple domains
-        types_present = set([c['type'] for c in cands if c['type']])
-        balanced = []
-        if len(types_present) >= 2:
-            # simple round-robin by type among top candidates
-            buckets = {}
-            for c in cands:
-                t = c['type'] or 'Unknown'
-                buckets.setdefault(t, []).append(c)
-            # interleave
-            while len(balanced) < k and any(buckets.values()):
-                for t in list(buckets.keys()):
-                    if buckets[t]:
-                        balanced.append(buckets[t].pop(0))
-                        if len(balanced) >= k:
-                            break
-        else:
-            balanced = cands[:k]
-        # Deduplicate by URL
-        seen = set()
-        uniq = []
-        for c in balanced:
-            if c['url'] and c['url'] not in seen:
-                seen.add(c['url'])
-                uniq.append(c)
+        # Dedup by URL, then balance across types (or MMR) in one selection pass
+        picked = select_candidates(
+            [c['type'] for c in cands],
+            [c['url'] for c in cands],
+            k,
+            scores=np.asarray([c['score'] for c in cands], dtype=np.float32),
+            emb=self.emb[[c['idx'] for c in cands]] if self.mmr_lambda is not None else None,
+            max_per_type=self.max_per_type,
+            type_quotas=self.type_quotas,
+            mmr_lambda=self.mmr_lambda,
+        )
+        uniq = [cands[i] for i in picked]
         # Ensure 5-10
         uniq = uniq[:max(5, min(k, 10))]
         results: List[Recommendation] = []
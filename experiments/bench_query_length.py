@@ -0,0 +1,48 @@
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from backend.recommender import Recommender
+from timing import bench
+
+WORDS = (
+    "We are hiring a Java developer who collaborates well with business teams, "
+    "writes clean SQL, communicates clearly with stakeholders and mentors junior engineers. "
+).split()
+
+
+def make_query(n_words: int) -> str:
+    return " ".join(WORDS[i % len(WORDS)] for i in range(n_words))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lengths', type=str, default='25,100,250,500,1000,2000,4000')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--pooling', type=str, default='mean', choices=['mean', 'max'])
+    args = parser.parse_args()
+
+    rec = Recommender()
+    rec.ensure_ready()
+    rec.query_pooling = args.pooling
+    # Warm up the model so the first measurement is not dominated by lazy init
+    rec._encode_query(make_query(10))
+
+    print(f"{'words':>6} {'tokens':>7} {'chunks':>6} {'truncated ms':>13} {'chunked ms':>11} {'search ms':>10}")
+    for n in [int(x) for x in args.lengths.split(',')]:
+        q = make_query(n)
+        tokens = len(rec.model.tokenizer(q, add_special_tokens=False)['input_ids'])
+        chunks = len(rec._query_chunks(q))
+        t_trunc = bench(lambda: rec.model.encode([q], normalize_embeddings=True, convert_to_numpy=True), args.repeat)
+        t_chunk = bench(lambda: rec._encode_query(q), args.repeat)
+        qvec = rec._encode_query(q)
+        t_knn = bench(lambda: rec._knn(qvec, topk=30), args.repeat)
+        print(f"{n:>6} {tokens:>7} {chunks:>6} {t_trunc:>13.1f} {t_chunk:>11.1f} {t_knn:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from backend.recommender import select_candidates
+from tests.reference import legacy_select
+from timing import bench
+
+
+def synth(n, n_types, dup_rate, rng):
+    type_names = [chr(ord('A') + i) for i in range(n_types)]
+    types = [type_names[i] for i in rng.integers(0, n_types, size=n)]
+    ids = np.arange(n)
+    dup = rng.random(n) < dup_rate
+    ids[dup] = rng.integers(0, n, size=int(dup.sum()))
+    urls = [f"https://example.com/{i}" for i in ids]
+    scores = np.sort(rng.random(n).astype(np.float32))[::-1].copy()
+    emb = rng.standard_normal((n, 384)).astype(np.float32)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+    return types, urls, scores, emb
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=str, default='30,300,3000,30000')
+    parser.add_argument('--types', type=int, default=5)
+    parser.add_argument('--dup-rate', type=float, default=0.0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--mmr-lambda', type=float, default=0.7)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'n':>7} {'k':>6} {'legacy ms':>10} {'select ms':>10} {'mmr@10 ms':>10}")
+    for n in [int(x) for x in args.sizes.split(',')]:
+        types, urls, scores, emb = synth(n, args.types, args.dup_rate, rng)
+        # Grow k with the pool, as a larger rerank pool would
+        k = max(10, n // 3)
+        # Without duplicates both stages must pick the same items in the same order
+        if args.dup_rate == 0.0:
+            new = [urls[i] for i in select_candidates(types, urls, k)]
+            assert new == legacy_select(types, urls, k), f"order mismatch at n={n}"
+        t_old = bench(lambda: legacy_select(types, urls, k), args.repeat)
+        t_new = bench(lambda: select_candidates(types, urls, k), args.repeat)
+        t_mmr = bench(lambda: select_candidates(types, urls, 10, scores=scores, emb=emb,
+                                                mmr_lambda=args.mmr_lambda), args.repeat)
+        print(f"{n:>7} {k:>6} {t_old:>10.2f} {t_new:>10.2f} {t_mmr:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
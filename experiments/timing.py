@@ -0,0 +1,11 @@
+import time
+
+
+def bench(fn, repeat):
+    # Best-of-repeat wall time in milliseconds
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0
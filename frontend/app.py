@@ -4,9 +4,124 @@ import streamlit as st
 from dotenv import load_dotenv
 import pandas as pd
 import io
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 
 load_dotenv()
 API_BASE = os.environ.get('API_BASE_URL', 'http://localhost:8000')
+BATCH_CHUNK = 10  # queries per /recommend/batch request
+BATCH_WORKERS = 4  # concurrent batch requests
+
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    # One pooled session per Streamlit server, reused across reruns
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=BATCH_WORKERS, pool_maxsize=BATCH_WORKERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def normalize_query(q: str) -> str:
+    return " ".join(str(q).split()).strip()
+
+
+RESPONSE_CACHE_MAX = 2000  # cached (API base, query) responses kept per server
+
+
+@st.cache_resource
+def get_response_cache():
+    # Shared by single and batch mode across all sessions:
+    # ({(api_base, query): recommended_assessments}, lock guarding it)
+    return {}, threading.Lock()
+
+
+def cache_get(api_base: str, query: str):
+    cache, lock = get_response_cache()
+    with lock:
+        return cache.get((api_base, query))
+
+
+def cache_put(api_base: str, query: str, recs: list):
+    cache, lock = get_response_cache()
+    with lock:
+        cache[(api_base, query)] = recs
+        while len(cache) > RESPONSE_CACHE_MAX:
+            cache.pop(next(iter(cache)), None)
+
+
+def fetch_recommendations(api_base: str, query: str) -> list:
+    cached = cache_get(api_base, query)
+    if cached is not None:
+        return cached
+    resp = get_session().post(f"{api_base}/recommend", json={"query": query}, timeout=60)
+    resp.raise_for_status()
+    recs = resp.json().get('recommended_assessments', [])
+    cache_put(api_base, query, recs)
+    return recs
+
+
+def post_batch(session: requests.Session, api_base: str, queries: list) -> list:
+    resp = session.post(f"{api_base}/recommend/batch", json={"queries": queries}, timeout=300)
+    resp.raise_for_status()
+    return resp.json().get('results', [])
+
+
+def run_batch(api_base: str, queries: list, progress):
+    """
+    Serve cached queries first, then send the rest in concurrent chunks.
+    Returns ({query: recommended_assessments}, {query: error}); a failed chunk
+    only loses its own queries.
+    """
+    out = {}
+    for q in queries:
+        cached = cache_get(api_base, q)
+        if cached is not None:
+            out[q] = cached
+    pending = [q for q in queries if q not in out]
+    failed = {}
+    total = len(queries)
+
+    def report():
+        text = f"Received {len(out)}/{total} queries"
+        if failed:
+            text += f" ({len(failed)} failed)"
+        progress.progress((len(out) + len(failed)) / total if total else 1.0, text=text)
+
+    report()
+    session = get_session()
+    chunks = [pending[i:i + BATCH_CHUNK] for i in range(0, len(pending), BATCH_CHUNK)]
+    with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+        futures = {pool.submit(post_batch, session, api_base, c): c for c in chunks}
+        for fut in as_completed(futures):
+            chunk = futures[fut]
+            try:
+                items = fut.result()
+            except Exception as e:
+                for q in chunk:
+                    failed[q] = str(e)
+            else:
+                for item in items:
+                    q = item.get('query')
+                    recs = item.get('recommended_assessments', [])
+                    out[q] = recs
+                    cache_put(api_base, q, recs)
+                for q in chunk:
+                    if q not in out:
+                        failed[q] = "Missing from batch response"
+            report()
+    return out, failed
+
+
+def find_query_col(df: pd.DataFrame):
+    for c in df.columns:
+        lc = str(c).lower().strip()
+        if lc in {"query", "job_description", "text", "prompt"}:
+            return c
+    return df.columns[0]
 
 st.set_page_config(page_title="SHL Assessment Recommender", layout="wide")
 
@@ -17,7 +132,7 @@ with st.sidebar:
     with col_h1:
         if st.button("Check API Health", use_container_width=True):
             try:
-                r = requests.get(f"{api_base}/health", timeout=10)
+                r = get_session().get(f"{api_base}/health", timeout=10)
                 if r.ok and r.json().get('status') == 'healthy':
                     st.success("Healthy")
                 else:
@@ -42,10 +157,7 @@ if st.button("Get Recommendations", type="primary"):
     else:
         with st.spinner("Fetching recommendations..."):
             try:
-                resp = requests.post(f"{api_base}/recommend", json={"query": query}, timeout=60)
-                resp.raise_for_status()
-                data = resp.json()
-                recs = data.get('recommended_assessments', [])
+                recs = fetch_recommendations(api_base.rstrip('/'), normalize_query(query))
                 if not recs:
                     st.info("No recommendations yet. Try crawling the catalog first.")
                 else:
@@ -64,7 +176,7 @@ if st.button("Get Recommendations", type="primary"):
                     st.dataframe(df, use_container_width=True, hide_index=True)
 
                     # Per-query CSV download in required evaluation format
-                    eval_rows = [{"Query": " ".join(query.split()).strip(), "Assessment_url": r.get('url')} for r in recs[:k]]
+                    eval_rows = [{"Query": normalize_query(query), "Assessment_url": r.get('url')} for r in recs[:k]]
                     eval_df = pd.DataFrame(eval_rows, columns=["Query", "Assessment_url"])
                     csv_buf = io.StringIO()
                     eval_df.to_csv(csv_buf, index=False)
@@ -77,3 +189,52 @@ if st.button("Get Recommendations", type="primary"):
                     )
             except Exception as e:
                 st.error(f"Error: {e}")
+
+st.divider()
+st.subheader("Batch mode")
+st.caption("Upload a CSV of queries (a `Query` column, or the first column) to score them all and download the combined evaluation-format CSV.")
+uploaded = st.file_uploader("Queries CSV", type=["csv"])
+if uploaded is not None:
+    raw = uploaded.getvalue()
+    try:
+        qdf = pd.read_csv(io.BytesIO(raw))
+    except Exception as e:
+        st.error(f"Could not read CSV: {e}")
+        qdf = None
+    if qdf is not None and not qdf.empty:
+        qcol = find_query_col(qdf)
+        queries = [normalize_query(q) for q in qdf[qcol].dropna()]
+        queries = [q for q in queries if q]
+        unique_queries = list(dict.fromkeys(queries))
+        st.write(f"{len(queries)} queries ({len(unique_queries)} unique) from column `{qcol}`.")
+        # Keep results across reruns (e.g. the download click) so nothing is re-sent
+        batch_key = (api_base.rstrip('/'), hashlib.sha1(raw).hexdigest())
+        if st.button("Run Batch", type="primary", disabled=not unique_queries):
+            progress = st.progress(0.0, text="Sending queries...")
+            st.session_state['batch'] = (batch_key,) + run_batch(batch_key[0], unique_queries, progress)
+        stored = st.session_state.get('batch')
+        if stored and stored[0] == batch_key:
+            results, failed = stored[1], stored[2]
+            if failed:
+                st.warning(f"{len(failed)} queries failed; run the batch again to retry only those.")
+                st.dataframe(
+                    pd.DataFrame([{"Query": q, "Error": err} for q, err in failed.items()]),
+                    use_container_width=True,
+                    hide_index=True,
+                )
+            eval_rows = [
+                {"Query": q, "Assessment_url": r.get('url')}
+                for q in unique_queries
+                for r in results.get(q, [])[:k]
+            ]
+            eval_df = pd.DataFrame(eval_rows, columns=["Query", "Assessment_url"])
+            st.dataframe(eval_df, use_container_width=True, hide_index=True)
+            csv_buf = io.StringIO()
+            eval_df.to_csv(csv_buf, index=False)
+            st.download_button(
+                label="Download CSV for all queries",
+                data=csv_buf.getvalue(),
+                file_name="predictions_batch.csv",
+                mime="text/csv",
+                use_container_width=True,
+            )
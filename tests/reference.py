@@ -0,0 +1,27 @@
+"""Reference implementations the tests and benchmarks compare against."""
+
+
+def legacy_select(types, urls, k):
+    # Previous post-retrieval stage: pop(0) round-robin by type, dedup afterwards
+    cands = [{'type': t, 'url': u} for t, u in zip(types, urls)]
+    types_present = set([c['type'] for c in cands if c['type']])
+    balanced = []
+    if len(types_present) >= 2:
+        buckets = {}
+        for c in cands:
+            buckets.setdefault(c['type'] or 'Unknown', []).append(c)
+        while len(balanced) < k and any(buckets.values()):
+            for t in list(buckets.keys()):
+                if buckets[t]:
+                    balanced.append(buckets[t].pop(0))
+                    if len(balanced) >= k:
+                        break
+    else:
+        balanced = cands[:k]
+    seen = set()
+    uniq = []
+    for c in balanced:
+        if c['url'] and c['url'] not in seen:
+            seen.add(c['url'])
+            uniq.append(c['url'])
+    return uniq
@@ -0,0 +1,102 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from backend.recommender import Recommender, _chunk_params_from_env
+
+
+class FakeTokenizer:
+    # One token per whitespace-separated word
+    def __call__(self, text, add_special_tokens=False):
+        return {'input_ids': text.split()}
+
+    def decode(self, ids):
+        return " ".join(ids)
+
+
+class FakeModel:
+    tokenizer = FakeTokenizer()
+    max_seq_length = 12  # 10 usable tokens per chunk
+
+    def encode(self, texts, **kwargs):
+        out = []
+        for t in texts:
+            v = np.random.default_rng(len(t)).standard_normal(8)
+            out.append(v / np.linalg.norm(v))
+        return np.asarray(out, dtype=np.float32)
+
+
+def make_rec(max_chunks=8):
+    rec = Recommender()
+    rec.model = FakeModel()
+    rec.max_query_chunks = max_chunks
+    return rec
+
+
+def words(n):
+    return " ".join(f"w{i}" for i in range(n))
+
+
+def test_short_query_is_single_chunk():
+    assert make_rec()._query_chunks(words(10)) == [words(10)]
+
+
+@pytest.mark.parametrize("n", [11, 19, 21, 37, 80])
+def test_chunks_are_balanced_and_bounded(n):
+    chunks = make_rec()._query_chunks(words(n))
+    sizes = [len(c.split()) for c in chunks]
+    assert len(chunks) == -(-n // 10)
+    assert sum(sizes) == n
+    assert max(sizes) <= 10
+    assert max(sizes) - min(sizes) <= 1
+
+
+def test_chunk_cap_keeps_first_and_last():
+    chunks = make_rec(max_chunks=3)._query_chunks(words(200))
+    assert len(chunks) == 3
+    assert chunks[0].split()[0] == 'w0'
+    assert chunks[-1].split()[-1] == 'w199'
+
+
+def test_chunk_size_capped_at_model_limit():
+    rec = make_rec()
+    rec.query_chunk_tokens = 50
+    assert max(len(c.split()) for c in rec._query_chunks(words(45))) <= 10
+    rec.query_chunk_tokens = 5
+    assert max(len(c.split()) for c in rec._query_chunks(words(45))) <= 5
+
+
+def test_chunk_params_from_env(monkeypatch):
+    for key in ('QUERY_CHUNK_TOKENS', 'QUERY_MAX_CHUNKS', 'QUERY_POOLING'):
+        monkeypatch.delenv(key, raising=False)
+    assert _chunk_params_from_env() == (None, 8, 'mean')
+    monkeypatch.setenv('QUERY_CHUNK_TOKENS', '128')
+    monkeypatch.setenv('QUERY_MAX_CHUNKS', '4')
+    monkeypatch.setenv('QUERY_POOLING', 'MAX')
+    assert _chunk_params_from_env() == (128, 4, 'max')
+
+
+@pytest.mark.parametrize("key,value", [
+    ('QUERY_CHUNK_TOKENS', '0'),
+    ('QUERY_MAX_CHUNKS', '0'),
+    ('QUERY_POOLING', 'median'),
+])
+def test_invalid_chunk_params_rejected(monkeypatch, key, value):
+    monkeypatch.setenv(key, value)
+    with pytest.raises(ValueError):
+        Recommender()
+
+
+@pytest.mark.parametrize("pooling", ['mean', 'max'])
+def test_pooled_query_is_normalized(pooling):
+    rec = make_rec()
+    rec.query_pooling = pooling
+    q = rec._encode_query(words(45))
+    assert q.dtype == np.float32
+    assert abs(float(np.linalg.norm(q)) - 1.0) < 1e-5
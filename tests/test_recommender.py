@@ -0,0 +1,123 @@
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from backend.recommender import Recommender
+
+
+class FakeModel:
+    # Deterministic pseudo-embeddings; records every encode call
+    max_seq_length = 256
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, **kwargs):
+        self.calls.append(list(texts))
+        out = []
+        for t in texts:
+            v = np.random.default_rng(sum(map(ord, t))).standard_normal(16)
+            out.append(v / np.linalg.norm(v))
+        return np.asarray(out, dtype=np.float32)
+
+
+def make_rec(monkeypatch):
+    monkeypatch.delenv('GEMINI_API_KEY', raising=False)
+    rec = Recommender()
+    rec.model = FakeModel()
+    rec.ensure_ready()
+    rec.model.calls.clear()
+    return rec
+
+
+def urls(recs):
+    return [r.assessment_url for r in recs]
+
+
+def test_recommend_batch_encodes_once_and_matches_single(monkeypatch):
+    rec = make_rec(monkeypatch)
+    queries = ["Java developer", "sales  manager\n", "Java developer", "data analyst with SQL"]
+    batch = rec.recommend_batch(queries, k=10)
+    assert len(rec.model.calls) == 1
+    assert len(rec.model.calls[0]) == 3  # unique normalized queries only
+    assert len(batch) == len(queries)
+    for q, recs in zip(queries, batch):
+        assert urls(recs) == urls(rec.recommend(q, k=10))
+
+
+class GatedRecommend:
+    # Stub for Recommender._recommend that blocks until released
+    def __init__(self, fail=False):
+        self.calls = []
+        self.release = threading.Event()
+        self.fail = fail
+
+    def __call__(self, query, k=10):
+        self.calls.append((query, k))
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("boom")
+        return [query]
+
+
+def run_concurrently(rec, args, stub):
+    results = [None] * len(args)
+
+    def call(i):
+        try:
+            results[i] = rec.recommend(*args[i])
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(args))]
+    for t in threads:
+        t.start()
+    # Release the computation only once every caller has joined a flight
+    deadline = time.time() + 5
+    while rec.coalescing_stats()['requests'] < len(args) and time.time() < deadline:
+        time.sleep(0.005)
+    stub.release.set()
+    for t in threads:
+        t.join(5)
+    return results
+
+
+def test_concurrent_duplicates_share_one_computation():
+    rec = Recommender()
+    rec._recommend = stub = GatedRecommend()
+    variants = ["java developer", "  java developer ", "java\ndeveloper", "java \t developer"]
+    args = [(variants[i % len(variants)], 10) for i in range(8)]
+    results = run_concurrently(rec, args, stub)
+    assert stub.calls == [("java developer", 10)]
+    assert all(r == ["java developer"] for r in results)
+    stats = rec.coalescing_stats()
+    assert stats == {'requests': 8, 'computed': 1, 'coalesced': 7, 'in_flight': 0}
+
+
+def test_different_k_is_not_coalesced():
+    rec = Recommender()
+    rec._recommend = stub = GatedRecommend()
+    run_concurrently(rec, [("java developer", 5), ("java developer", 10)], stub)
+    assert sorted(stub.calls) == [("java developer", 5), ("java developer", 10)]
+    stats = rec.coalescing_stats()
+    assert (stats['computed'], stats['coalesced'], stats['in_flight']) == (2, 0, 0)
+
+
+def test_leader_error_reaches_every_waiter():
+    rec = Recommender()
+    rec._recommend = stub = GatedRecommend(fail=True)
+    results = run_concurrently(rec, [("java developer", 10)] * 5, stub)
+    assert len(stub.calls) == 1
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert rec.coalescing_stats()['in_flight'] == 0
+    # A later call recomputes instead of reusing the failed flight
+    stub.fail = False
+    assert rec.recommend("java developer", 10) == ["java developer"]
+    assert len(stub.calls) == 2
@@ -0,0 +1,101 @@
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from backend.recommender import _selection_params_from_env, select_candidates
+from tests.reference import legacy_select
+
+TYPES = ['A', 'B', 'C', None]
+
+
+def random_case(rng, unique_urls=False):
+    n = int(rng.integers(0, 60))
+    types = [TYPES[i] for i in rng.integers(0, len(TYPES), size=n)]
+    if unique_urls:
+        urls = [f"u{i}" for i in range(n)]
+    else:
+        urls = [f"u{rng.integers(0, 40)}" if rng.random() > 0.1 else None for _ in range(n)]
+    scores = np.sort(rng.random(n).astype(np.float32))[::-1].copy()
+    emb = rng.standard_normal((n, 8)).astype(np.float32)
+    if n:
+        emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+    return types, urls, scores, emb
+
+
+def check_basic(picked, urls, k):
+    chosen = [urls[i] for i in picked]
+    assert len(picked) <= k
+    assert None not in chosen
+    assert len(set(chosen)) == len(chosen)
+    # Only the best-ranked copy of a URL may take a slot
+    first = {}
+    for i, u in enumerate(urls):
+        first.setdefault(u, i)
+    assert all(first[urls[i]] == i for i in picked)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_dedup_and_length(seed):
+    rng = np.random.default_rng(seed)
+    types, urls, scores, emb = random_case(rng)
+    k = int(rng.integers(0, 15))
+    picked = select_candidates(types, urls, k)
+    check_basic(picked, urls, k)
+    n_unique = len(set(u for u in urls if u))
+    assert len(picked) == min(k, n_unique)
+
+
+@pytest.mark.parametrize("seed", range(200))
+@pytest.mark.parametrize("mmr", [None, 0.5])
+def test_caps_respected(seed, mmr):
+    rng = np.random.default_rng(seed)
+    types, urls, scores, emb = random_case(rng)
+    k = int(rng.integers(0, 15))
+    cap = int(rng.integers(0, 4))
+    quotas = {'A': int(rng.integers(0, 3))}
+    picked = select_candidates(types, urls, k, scores=scores, emb=emb,
+                               max_per_type=cap, type_quotas=quotas, mmr_lambda=mmr)
+    check_basic(picked, urls, k)
+    counts = Counter(types[i] or 'Unknown' for i in picked)
+    for t, c in counts.items():
+        assert c <= quotas.get(t, cap)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_legacy_round_robin(seed):
+    rng = np.random.default_rng(seed)
+    types, urls, _, _ = random_case(rng, unique_urls=True)
+    k = int(rng.integers(0, 15))
+    picked = select_candidates(types, urls, k)
+    assert [urls[i] for i in picked] == legacy_select(types, urls, k)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {'max_per_type': -1},
+    {'type_quotas': {'K': -2}},
+    {'mmr_lambda': 1.5},
+    {'mmr_lambda': -0.1},
+])
+def test_invalid_params_rejected(kwargs):
+    with pytest.raises(ValueError):
+        select_candidates(['A'], ['u0'], 1, **kwargs)
+
+
+def test_params_from_env(monkeypatch):
+    monkeypatch.setenv('SELECT_MAX_PER_TYPE', '3')
+    monkeypatch.setenv('SELECT_TYPE_QUOTAS', 'K=2, P=0')
+    monkeypatch.setenv('SELECT_MMR_LAMBDA', '0.7')
+    assert _selection_params_from_env() == (3, {'K': 2, 'P': 0}, 0.7)
+    monkeypatch.setenv('SELECT_MMR_LAMBDA', '2')
+    with pytest.raises(ValueError):
+        _selection_params_from_env()
+    for key in ('SELECT_MAX_PER_TYPE', 'SELECT_TYPE_QUOTAS', 'SELECT_MMR_LAMBDA'):
+        monkeypatch.delenv(key)
+    assert _selection_params_from_env() == (None, None, None)